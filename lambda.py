@@ -1,8 +1,32 @@
 import json
 import boto3
 import os
+import time
+import unicodedata
 from datetime import datetime
 
+# アカウント名キャッシュの有効期間（秒）
+ACCOUNT_CACHE_TTL = int(os.environ.get('ACCOUNT_CACHE_TTL', 3600))
+
+# 1つのカードにまとめるFindingの最大数
+CARD_MAX_FINDINGS = int(os.environ.get('CARD_MAX_FINDINGS', 10))
+
+# SNSメッセージの上限(256KB)に対して余裕を持たせたサイズ
+MAX_MESSAGE_BYTES = 240 * 1024
+
+# SNS Subjectの最大文字数（100文字未満である必要がある）
+MAX_SUBJECT_LENGTH = 99
+
+# Organizationsから取得できない場合のアカウント名（必要に応じてカスタマイズ）
+ACCOUNT_NAME_OVERRIDES = {
+    # 実際のアカウントIDとアカウント名に置き換えてください
+    '123456789012': 'Production Account',
+    '123456789013': 'Development Account',
+    '123456789014': 'Staging Account'
+}
+
+SEVERITY_ORDER = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW', 'INFORMATIONAL']
+
 def lambda_handler(event, context):
     sns = boto3.client('sns')
     
@@ -16,71 +40,13 @@ def lambda_handler(event, context):
             'body': json.dumps('No findings to process')
         }
     
-    # メール本文を作成
-    for finding in findings:
-        # 必要な情報を抽出
-        region = finding.get('Region', 'Unknown')
-        account_id = finding.get('AwsAccountId', 'Unknown')
-        account_name = get_account_name(account_id)
-        resource_id = finding.get('Resources', [{}])[0].get('Id', 'Unknown')
-        resource_type = finding.get('Resources', [{}])[0].get('Type', 'Unknown')
-        title = finding.get('Title', 'Unknown')
-        severity = finding.get('Severity', {}).get('Label', 'Unknown')
-        description = finding.get('Description', 'No description available')
-        
-        # Teams向けのメッセージを構築
-        teams_message = {
-            "version": "1.0",
-            "type": "message",
-            "attachments": [
-                {
-                    "contentType": "application/vnd.microsoft.card.adaptive",
-                    "content": {
-                        "type": "AdaptiveCard",
-                        "version": "1.3",
-                        "body": [
-                            {
-                                "type": "TextBlock",
-                                "text": f"🚨 Security Hub Alert - {severity}",
-                                "weight": "Bolder",
-                                "size": "Medium",
-                                "color": "Attention" if severity in ["HIGH", "CRITICAL"] else "Warning"
-                            },
-                            {
-                                "type": "TextBlock",
-                                "text": title,
-                                "weight": "Bolder",
-                                "wrap": True
-                            },
-                            {
-                                "type": "FactSet",
-                                "facts": [
-                                    {"title": "リージョン名", "value": region},
-                                    {"title": "アカウント名", "value": account_name},
-                                    {"title": "アカウントID", "value": account_id},
-                                    {"title": "リソースID", "value": resource_id},
-                                    {"title": "リソース名", "value": resource_type},
-                                    {"title": "影響", "value": severity},
-                                    {"title": "検出時刻", "value": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                                ]
-                            },
-                            {
-                                "type": "TextBlock",
-                                "text": f"**説明:** {description}",
-                                "wrap": True
-                            }
-                        ]
-                    }
-                }
-            ]
-        }
-        
-        # SNSトピックにメッセージを送信
+    # 複数のFindingを1枚のカードにまとめて送信
+    for subject, message in render_cards(findings):
         try:
             response = sns.publish(
                 TopicArn=os.environ['SNS_TOPIC_ARN'],
-                Message=json.dumps(teams_message),
-                Subject=f"Security Hub Alert - {severity} - {title}"
+                Message=message,
+                Subject=subject
             )
             print(f"Message sent successfully: {response['MessageId']}")
         except Exception as e:
@@ -92,14 +58,172 @@ def lambda_handler(event, context):
         'body': json.dumps('Successfully processed Security Hub findings')
     }
 
+class AccountDirectory:
+    """AWS Organizationsのアカウント名をウォームコンテナ内でキャッシュ"""
+    
+    def __init__(self, ttl=ACCOUNT_CACHE_TTL):
+        self.ttl = ttl
+        self._names = {}
+        self._loaded_at = None
+        self._client = None
+    
+    def _organizations(self):
+        if self._client is None:
+            self._client = boto3.client('organizations')
+        return self._client
+    
+    def refresh(self):
+        """list_accountsで全アカウント名を読み込む"""
+        names = {}
+        paginator = self._organizations().get_paginator('list_accounts')
+        for page in paginator.paginate():
+            for account in page['Accounts']:
+                names[account['Id']] = account['Name']
+        
+        self._names = names
+        self._loaded_at = time.monotonic()
+        print(f"Loaded {len(names)} account names from Organizations")
+    
+    def get_name(self, account_id):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            try:
+                self.refresh()
+            except Exception as e:
+                # 失敗時もTTLの間は再取得しない（個別取得にフォールバック）
+                print(f"Error listing accounts: {str(e)}")
+                self._loaded_at = time.monotonic()
+        
+        name = self._names.get(account_id)
+        if name is None:
+            name = self._lookup(account_id)
+        return name
+    
+    def _lookup(self, account_id):
+        """一覧に無いアカウントを個別に取得（失敗時は既定の名前をキャッシュ）"""
+        try:
+            response = self._organizations().describe_account(AccountId=account_id)
+            name = response['Account']['Name']
+        except Exception as e:
+            print(f"Error describing account {account_id}: {str(e)}")
+            name = ACCOUNT_NAME_OVERRIDES.get(account_id, f'Account-{account_id}')
+        
+        self._names[account_id] = name
+        return name
+
+_account_directory = AccountDirectory()
+
 def get_account_name(account_id):
-    """アカウントIDからアカウント名を取得（必要に応じてカスタマイズ）"""
-    # アカウントIDとアカウント名のマッピング
-    account_mapping = {
-        # 実際のアカウントIDとアカウント名に置き換えてください
-        '123456789012': 'Production Account',
-        '123456789013': 'Development Account',
-        '123456789014': 'Staging Account'
+    """アカウントIDからアカウント名を取得"""
+    return _account_directory.get_name(account_id)
+
+def _compile_card_template():
+    """Adaptive Cardの固定部分を一度だけシリアライズし、本文の前後に分割"""
+    envelope = {
+        "version": "1.0",
+        "type": "message",
+        "attachments": [
+            {
+                "contentType": "application/vnd.microsoft.card.adaptive",
+                "content": {
+                    "type": "AdaptiveCard",
+                    "version": "1.3",
+                    "body": "__BODY__"
+                }
+            }
+        ]
     }
+    prefix, suffix = json.dumps(envelope).split('"__BODY__"')
+    return prefix, suffix
+
+CARD_PREFIX, CARD_SUFFIX = _compile_card_template()
+
+def render_finding_blocks(finding, detected_at):
+    """1件のFindingをカード本文の要素（JSON文字列）に変換"""
+    
+    # 必要な情報を抽出
+    region = finding.get('Region', 'Unknown')
+    account_id = finding.get('AwsAccountId', 'Unknown')
+    account_name = get_account_name(account_id)
+    resource_id = finding.get('Resources', [{}])[0].get('Id', 'Unknown')
+    resource_type = finding.get('Resources', [{}])[0].get('Type', 'Unknown')
+    title = finding.get('Title', 'Unknown')
+    severity = finding.get('Severity', {}).get('Label', 'Unknown')
+    description = finding.get('Description', 'No description available')
     
-    return account_mapping.get(account_id, f'Account-{account_id}')
\ No newline at end of file
+    blocks = [
+        {
+            "type": "TextBlock",
+            "text": f"🚨 Security Hub Alert - {severity}",
+            "weight": "Bolder",
+            "size": "Medium",
+            "color": "Attention" if severity in ["HIGH", "CRITICAL"] else "Warning",
+            "separator": True
+        },
+        {
+            "type": "TextBlock",
+            "text": title,
+            "weight": "Bolder",
+            "wrap": True
+        },
+        {
+            "type": "FactSet",
+            "facts": [
+                {"title": "リージョン名", "value": region},
+                {"title": "アカウント名", "value": account_name},
+                {"title": "アカウントID", "value": account_id},
+                {"title": "リソースID", "value": resource_id},
+                {"title": "リソース名", "value": resource_type},
+                {"title": "影響", "value": severity},
+                {"title": "検出時刻", "value": detected_at}
+            ]
+        },
+        {
+            "type": "TextBlock",
+            "text": f"**説明:** {description}",
+            "wrap": True
+        }
+    ]
+    return ', '.join(json.dumps(block) for block in blocks)
+
+def render_cards(findings):
+    """Findingをまとめたカードを(Subject, Message)の組で返す"""
+    
+    detected_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    overhead = len(CARD_PREFIX) + len(CARD_SUFFIX) + 2
+    
+    batch = []
+    batch_bytes = overhead
+    for finding in findings:
+        blocks = render_finding_blocks(finding, detected_at)
+        block_bytes = len(blocks.encode('utf-8')) + 2
+        
+        if batch and (len(batch) >= CARD_MAX_FINDINGS or batch_bytes + block_bytes > MAX_MESSAGE_BYTES):
+            yield _render_card(batch)
+            batch = []
+            batch_bytes = overhead
+        
+        batch.append((finding, blocks))
+        batch_bytes += block_bytes
+    
+    if batch:
+        yield _render_card(batch)
+
+def _render_card(batch):
+    severities = [f.get('Severity', {}).get('Label', 'Unknown') for f, _ in batch]
+    top_severity = min(
+        severities,
+        key=lambda s: SEVERITY_ORDER.index(s) if s in SEVERITY_ORDER else len(SEVERITY_ORDER)
+    )
+    
+    if len(batch) == 1:
+        subject = f"Security Hub Alert - {top_severity} - {batch[0][0].get('Title', 'Unknown')}"
+    else:
+        subject = f"Security Hub Alert - {top_severity} - {len(batch)} findings"
+    
+    message = f"{CARD_PREFIX}[{', '.join(blocks for _, blocks in batch)}]{CARD_SUFFIX}"
+    return _sanitize_subject(subject), message
+
+def _sanitize_subject(subject):
+    """SNS Subjectで使えない改行・制御文字を空白にし、上限文字数に収める"""
+    cleaned = ''.join(' ' if unicodedata.category(c).startswith('C') else c for c in subject)
+    return ' '.join(cleaned.split())[:MAX_SUBJECT_LENGTH]
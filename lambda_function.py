@@ -1,8 +1,102 @@
+import errno
 import json
 import boto3
 import socket
 import os
+import random
+import selectors
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from botocore.config import Config
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
+from urllib.parse import urlparse
+
+# Lambda同期レスポンスの上限(6MB)に対して余裕を持たせたサイズ
+MAX_RESPONSE_BYTES = int(os.environ.get('MAX_RESPONSE_BYTES', 5 * 1024 * 1024))
+
+# 結果のエンコード中にメモリ上に保持する上限（超過分は/tmpへ退避）
+RESULT_SPOOL_MEMORY_BYTES = 1024 * 1024
+
+# サマリーのみのレスポンスに含めるアクセス可能Finding IDの上限
+MAX_SUMMARY_FINDINGS = 100
+
+# Severity.Labelごとの優先度（小さいほど先に処理）
+SEVERITY_PRIORITY = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3, 'INFORMATIONAL': 4}
+
+# SNS通知・結果出力のために残しておく時間（ミリ秒）
+SCHEDULER_RESERVE_MS = int(os.environ.get('SCHEDULER_RESERVE_MS', 5000))
+
+# 再実行による先送りの最大回数と1回あたりのFinding数
+MAX_DEFER_DEPTH = int(os.environ.get('MAX_DEFER_DEPTH', 3))
+DEFER_BATCH_SIZE = 50
+
+# AWS API呼び出しのレート制限（サービス・リージョン単位）
+AWS_API_RATE = float(os.environ.get('AWS_API_RATE', 10))
+AWS_API_BURST = int(os.environ.get('AWS_API_BURST', 20))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 10))
+
+# 宛先ホスト単位のレート制限と同時接続数の上限
+PROBE_HOST_RATE = float(os.environ.get('PROBE_HOST_RATE', 5))
+PROBE_HOST_BURST = int(os.environ.get('PROBE_HOST_BURST', 5))
+PROBE_HOST_CONCURRENCY = int(os.environ.get('PROBE_HOST_CONCURRENCY', 2))
+
+# 制限状態を保持する宛先ホスト数の上限（超えた分は使用中でない古いホストから破棄）
+MAX_TRACKED_HOSTS = int(os.environ.get('MAX_TRACKED_HOSTS', 1024))
+
+# スロットリングとして扱うAWSのエラーコード
+THROTTLE_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'SlowDown'
+}
+
+# Happy Eyeballs (RFC 8305) の接続試行間隔（秒）
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+ADDRESS_FAMILY_NAMES = {socket.AF_INET: 'IPv4', socket.AF_INET6: 'IPv6'}
+
+# 1回の接続テスト（TCP/HTTP）のタイムアウト（秒）
+PROBE_TIMEOUT = 5
+
+# HTTPテスト1回で発生しうるタイムアウトの回数（接続・応答待ち）
+HTTP_PROBE_TIMEOUTS = 2
+
+# AWS API呼び出し1回あたりの接続・読み込みタイムアウト（秒）
+AWS_API_TIMEOUT = int(os.environ.get('AWS_API_TIMEOUT', 5))
+
+def _worst_case_cost(api_calls=0, tcp_probes=0, http_probes=0):
+    """各テストのタイムアウトと試行回数から最悪の所要時間を求める（秒）"""
+    probe_wait = 1.0 / PROBE_HOST_RATE
+    return (
+        api_calls * AWS_API_TIMEOUT
+        + tcp_probes * (PROBE_TIMEOUT + probe_wait)
+        + http_probes * (HTTP_PROBE_TIMEOUTS * PROBE_TIMEOUT + probe_wait)
+    )
+
+# リソースタイプ別のテスト所要時間の見積もり（秒）
+RESOURCE_COST_ESTIMATES = {
+    'AWS::EC2::Instance': _worst_case_cost(api_calls=1, http_probes=2, tcp_probes=4),
+    'AWS::RDS::DBInstance': _worst_case_cost(api_calls=1, tcp_probes=1),
+    'AWS::S3::Bucket': _worst_case_cost(http_probes=2),
+    'AWS::Lambda::Function': _worst_case_cost(api_calls=1, http_probes=1),
+    'AWS::EKS::Cluster': _worst_case_cost(api_calls=1, http_probes=1),
+    'AWS::ECS::Service': 0.1,
+    'AWS::DynamoDB::Table': 0.1,
+    'AWS::IAM::User': 0.1
+}
+
+# 未対応のリソースタイプはテストせずに終了する
+DEFAULT_RESOURCE_COST = 0.1
 
 def lambda_handler(event, context):
     """
@@ -10,30 +104,41 @@ def lambda_handler(event, context):
     """
     print(f"Event received: {json.dumps(event, default=str)}")
     
+    stream = ResultStream()
     try:
-        # EventBridgeイベントからfindingsを抽出
-        detail = event.get('detail', {})
-        findings = detail.get('findings', [])
-        
-        results = []
-        
-        for finding in findings:
-            # Exposure Findingのみ処理
-            if 'Exposure' in finding.get('Type', []):
-                result = process_finding(finding)
-                results.append(result)
-        
-        # SNS通知
-        if results:
-            send_sns_notification(results)
+        # Exposure Findingのみ処理
+        findings, depth = extract_findings(event)
+        findings = [f for f in findings if is_exposure_finding(f)]
+        
+        # 重要度順に処理し、残り時間に収まらないものは先送り
+        scheduler = ProbeScheduler(findings, context)
+        for finding in scheduler:
+            stream.write(process_finding(finding))
+        
+        deferred_to = None
+        undelivered = []
+        if scheduler.deferred:
+            deferred_to, undelivered = defer_findings(scheduler.deferred, context, depth)
+        
+        # SNS通知（本文に載るのはアクセス可能な結果のみ）
+        if stream.processed_count:
+            send_sns_notification(stream.accessible_results, total_count=stream.processed_count)
+        
+        # 結果の保存先が設定されていれば全件を書き出す
+        results_location = None
+        results_sink = os.environ.get('RESULTS_SINK')
+        if results_sink:
+            try:
+                results_location = stream.export(results_sink)
+            except Exception as e:
+                # 保存に失敗してもテスト結果のレスポンスは返す
+                print(f"Results export error: {e}")
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Success',
-                'processed_count': len(results),
-                'results': results
-            }, default=str)
+            'body': build_response_body(
+                stream, results_location, scheduler.deferred, deferred_to, undelivered
+            )
         }
         
     except Exception as e:
@@ -42,6 +147,304 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        stream.discard()
+
+def extract_findings(event):
+    """
+    EventBridge・再実行・SQSのいずれのイベント形式からもfindingsと先送り回数を取り出す
+    SQSの複数メッセージで回数が異なる場合は最大値を採用
+    """
+    
+    findings = list(event.get('detail', {}).get('findings', []))
+    depth = event.get('deferred_depth', 0)
+    
+    for record in event.get('Records', []):
+        if record.get('eventSource') == 'aws:sqs':
+            body = json.loads(record['body'])
+            findings.extend(body.get('findings', []))
+            depth = max(depth, body.get('deferred_depth', 0))
+    
+    return findings, depth
+
+def is_exposure_finding(finding):
+    """Exposure Findingかどうか（ASFFの'Types'と従来の'Type'の両方に対応）"""
+    
+    return 'Exposure' in (finding.get('Types', finding.get('Type')) or [])
+
+def estimate_finding_cost(finding):
+    """Findingのテスト所要時間を見積もる（秒）"""
+    
+    return sum(
+        RESOURCE_COST_ESTIMATES.get(resource.get('Type', ''), DEFAULT_RESOURCE_COST)
+        for resource in finding.get('Resources', [])
+    )
+
+class ProbeScheduler:
+    """重要度と残り実行時間に基づいてFindingの処理順序を決める"""
+    
+    def __init__(self, findings, context=None):
+        self._get_remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+        self.deferred = []
+        self.scale = 1.0
+        
+        # 重要度ごとにまとめ、同じ重要度の中では見積もりの小さいものから処理
+        classes = {}
+        for finding in findings:
+            severity = (finding.get('Severity') or {}).get('Label') or 'UNKNOWN'
+            classes.setdefault(severity, []).append((estimate_finding_cost(finding), finding))
+        
+        self._classes = []
+        for severity in sorted(classes, key=lambda s: SEVERITY_PRIORITY.get(s, len(SEVERITY_PRIORITY))):
+            entries = sorted(classes[severity], key=lambda entry: entry[0])
+            self._classes.append((severity, entries))
+    
+    def remaining_seconds(self):
+        """予約時間を除いた残り実行時間（コンテキストが無い場合はNone）"""
+        if self._get_remaining_ms is None:
+            return None
+        return (self._get_remaining_ms() - SCHEDULER_RESERVE_MS) / 1000.0
+    
+    def __iter__(self):
+        for severity, entries in self._classes:
+            for cost, finding in entries:
+                if self._get_remaining_ms is None:
+                    yield finding
+                    continue
+                
+                # 上位クラスから順に残り時間を使い、収まらないものだけ先送り
+                before = self.remaining_seconds()
+                if cost * self.scale > before:
+                    self.deferred.append(finding)
+                    continue
+                
+                yield finding
+                
+                # 見積もりを超えた実績があれば、以降の見積もりを同じ比率で引き上げる
+                elapsed = before - self.remaining_seconds()
+                if cost > 0 and elapsed > cost * self.scale:
+                    self.scale = elapsed / cost
+                    print(f"Probe took {elapsed:.1f}s (estimate {cost:.1f}s), scaling estimates by {self.scale:.2f}")
+        
+        if self.deferred:
+            print(f"Deferred {len(self.deferred)} findings due to time budget")
+
+def defer_findings(findings, context, depth=0):
+    """
+    先送りしたFindingをSQSキューまたはLambdaの非同期再実行へ渡す
+    (渡し先, 渡せなかったFindingのリスト) を返す
+    """
+    
+    if depth >= MAX_DEFER_DEPTH:
+        print(f"Defer depth limit reached ({depth}), not deferring")
+        return None, list(findings)
+    
+    queue_url = os.environ.get('DEFERRED_QUEUE_URL')
+    function_arn = getattr(context, 'invoked_function_arn', None)
+    failed = []
+    
+    if queue_url:
+        sqs = get_client('sqs')
+        for i in range(0, len(findings), 10):
+            batch = findings[i:i + 10]
+            try:
+                response = sqs.send_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {
+                            'Id': str(n),
+                            'MessageBody': json.dumps(
+                                {'findings': [finding], 'deferred_depth': depth + 1}, default=str
+                            )
+                        }
+                        for n, finding in enumerate(batch)
+                    ]
+                )
+            except Exception as e:
+                print(f"Defer error: {e}")
+                failed.extend(batch)
+                continue
+            
+            for entry in response.get('Failed', []):
+                print(f"Defer error: {entry.get('Code')} {entry.get('Message')}")
+                failed.append(batch[int(entry['Id'])])
+        return 'sqs', failed
+    
+    if os.environ.get('REINVOKE_DEFERRED', '').lower() == 'true' and function_arn:
+        lambda_client = get_client('lambda')
+        for i in range(0, len(findings), DEFER_BATCH_SIZE):
+            batch = findings[i:i + DEFER_BATCH_SIZE]
+            try:
+                lambda_client.invoke(
+                    FunctionName=function_arn,
+                    InvocationType='Event',
+                    Payload=json.dumps({
+                        'detail': {'findings': batch},
+                        'deferred_depth': depth + 1
+                    }, default=str)
+                )
+            except Exception as e:
+                print(f"Defer error: {e}")
+                failed.extend(batch)
+        return 'lambda', failed
+    
+    print("No deferral target configured (DEFERRED_QUEUE_URL / REINVOKE_DEFERRED)")
+    return None, list(findings)
+
+def _intern(value):
+    """文字列のみinternする（不正なFindingのNone等はそのまま）"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class _Record:
+    """__slots__ベースの結果レコード共通処理"""
+    
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        # 従来の辞書形式の結果と同じアクセスを許可
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class ResourceTestResult(_Record):
+    """リソース単位のテスト結果"""
+    
+    __slots__ = ('resource_type', 'resource_id', 'is_accessible', 'details')
+    
+    def __init__(self, resource_type, resource_id, is_accessible, details):
+        # リソースタイプとテスト方式は種類が少ないためinternして共有する
+        self.resource_type = _intern(resource_type)
+        self.resource_id = resource_id
+        self.is_accessible = is_accessible
+        for key in ('method', 'address_family'):
+            if key in details:
+                details[key] = _intern(details[key])
+        self.details = details
+
+class FindingResult(_Record):
+    """Finding単位のテスト結果"""
+    
+    __slots__ = ('finding_id', 'title', 'severity', 'timestamp', 'is_accessible', 'test_results')
+    
+    def __init__(self, finding_id, title, severity, timestamp):
+        self.finding_id = finding_id
+        self.title = title
+        self.severity = _intern(severity)
+        self.timestamp = timestamp
+        self.is_accessible = False
+        self.test_results = []
+    
+    def add(self, test_result):
+        self.test_results.append(test_result)
+        if test_result.is_accessible:
+            self.is_accessible = True
+    
+    def to_dict(self):
+        result = _Record.to_dict(self)
+        result['test_results'] = [r.to_dict() for r in self.test_results]
+        return result
+
+class ResultStream:
+    """FindingResultをJSON配列として逐次エンコードする"""
+    
+    def __init__(self):
+        self._spool = tempfile.SpooledTemporaryFile(max_size=RESULT_SPOOL_MEMORY_BYTES)
+        self._spool.write(b'[')
+        self._closed = False
+        self.size = 1
+        self.processed_count = 0
+        self.accessible_results = []
+    
+    def write(self, result):
+        chunk = json.dumps(result.to_dict(), default=str).encode('utf-8')
+        if self.processed_count:
+            self._spool.write(b', ')
+            self.size += 2
+        self._spool.write(chunk)
+        self.size += len(chunk)
+        self.processed_count += 1
+        
+        # 通知用にアクセス可能な結果のみ保持
+        if result.is_accessible:
+            self.accessible_results.append(result)
+    
+    def close(self):
+        if not self._closed:
+            self._spool.write(b']')
+            self.size += 1
+            self._closed = True
+    
+    def read(self):
+        """エンコード済みのJSON配列を文字列で返す"""
+        self.close()
+        self._spool.seek(0)
+        return self._spool.read().decode('utf-8')
+    
+    def export(self, destination):
+        """JSON配列をS3(s3://bucket/prefix)またはローカルファイルへ書き出す"""
+        self.close()
+        self._spool.seek(0)
+        
+        if destination.startswith('s3://'):
+            bucket, _, prefix = destination[len('s3://'):].partition('/')
+            key = f"{prefix.rstrip('/')}/{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}.json".lstrip('/')
+            get_client('s3').upload_fileobj(self._spool, bucket, key)
+            location = f"s3://{bucket}/{key}"
+        else:
+            with open(destination, 'wb') as f:
+                shutil.copyfileobj(self._spool, f)
+            location = destination
+        
+        print(f"Results exported: {location} ({self.size} bytes)")
+        return location
+    
+    def discard(self):
+        self._spool.close()
+
+def build_response_body(stream, results_location=None, deferred=None, deferred_to=None, undelivered=None):
+    """レスポンス本文を作成（上限を超える場合はサマリーのみ）"""
+    
+    header = {
+        'message': 'Success',
+        'processed_count': stream.processed_count,
+        'accessible_count': len(stream.accessible_results)
+    }
+    if results_location:
+        header['results_location'] = results_location
+    if deferred:
+        header['deferred_count'] = len(deferred)
+        header['deferred_to'] = deferred_to
+        header['deferred_findings'] = [f.get('Id', '') for f in deferred]
+    if undelivered:
+        # 先送り先へ渡せず、今回も次回も検査されないFinding
+        header['undelivered_findings'] = [f.get('Id', '') for f in undelivered]
+    
+    prefix = json.dumps(header)[:-1]
+    stream.close()
+    
+    # bodyはレスポンス内でさらにJSON文字列としてエスケープされるため、エスケープ後のサイズで判定する
+    if len(prefix) + len(', "results": }') + stream.size <= MAX_RESPONSE_BYTES:
+        body = f'{prefix}, "results": {stream.read()}}}'
+        escaped_size = len(json.dumps(body))
+        if escaped_size <= MAX_RESPONSE_BYTES:
+            return body
+        print(f"Escaped response too large ({escaped_size} bytes), returning summary only")
+    else:
+        print(f"Response too large ({stream.size} bytes), returning summary only")
+    
+    header['results_truncated'] = True
+    if deferred:
+        header['deferred_findings'] = header['deferred_findings'][:MAX_SUMMARY_FINDINGS]
+    if undelivered:
+        header['undelivered_findings'] = header['undelivered_findings'][:MAX_SUMMARY_FINDINGS]
+    header['accessible_findings'] = [
+        r.finding_id for r in stream.accessible_results[:MAX_SUMMARY_FINDINGS]
+    ]
+    return json.dumps(header, default=str)
 
 def process_finding(finding):
     """個別のExposure Findingを処理"""
@@ -50,14 +453,7 @@ def process_finding(finding):
     title = finding.get('Title', '')
     severity = finding.get('Severity', {}).get('Label', 'UNKNOWN')
     
-    result = {
-        'finding_id': finding_id,
-        'title': title,
-        'severity': severity,
-        'timestamp': datetime.utcnow().isoformat(),
-        'is_accessible': False,
-        'test_results': []
-    }
+    result = FindingResult(finding_id, title, severity, datetime.utcnow().isoformat())
     
     # リソースをテスト
     resources = finding.get('Resources', [])
@@ -69,15 +465,7 @@ def process_finding(finding):
         
         is_accessible, details = test_resource(resource_type, resource_id)
         
-        result['test_results'].append({
-            'resource_type': resource_type,
-            'resource_id': resource_id,
-            'is_accessible': is_accessible,
-            'details': details
-        })
-        
-        if is_accessible:
-            result['is_accessible'] = True
+        result.add(ResourceTestResult(resource_type, resource_id, is_accessible, details))
     
     return result
 
@@ -111,7 +499,7 @@ def test_ec2_instance(resource_id):
     """EC2インスタンスの匿名アクセステスト"""
     
     try:
-        ec2 = boto3.client('ec2')
+        ec2 = get_client('ec2')
         instance_id = resource_id.split('/')[-1]
         
         response = ec2.describe_instances(InstanceIds=[instance_id])
@@ -133,10 +521,13 @@ def test_ec2_instance(resource_id):
                 
                 # TCPポートテスト
                 for port in [22, 80, 443, 3389]:
-                    if test_tcp_port(public_ip, port):
+                    connection = connect_tcp(public_ip, port)
+                    if connection:
                         return True, {
                             'accessible_endpoint': f"{public_ip}:{port}",
-                            'method': 'TCP'
+                            'method': 'TCP',
+                            'address_family': connection['address_family'],
+                            'address': connection['address']
                         }
         
         return False, {'message': 'No accessible endpoints found'}
@@ -148,7 +539,7 @@ def test_rds_instance(resource_id):
     """RDSインスタンスの匿名アクセステスト"""
     
     try:
-        rds = boto3.client('rds')
+        rds = get_client('rds')
         db_identifier = resource_id.split(':')[-1]
         
         response = rds.describe_db_instances(DBInstanceIdentifier=db_identifier)
@@ -161,10 +552,13 @@ def test_rds_instance(resource_id):
             address = endpoint.get('Address')
             port = endpoint.get('Port', 3306)
             
-            if address and test_tcp_port(address, port):
+            connection = connect_tcp(address, port) if address else None
+            if connection:
                 return True, {
                     'accessible_endpoint': f"{address}:{port}",
-                    'method': 'TCP'
+                    'method': 'TCP',
+                    'address_family': connection['address_family'],
+                    'address': connection['address']
                 }
         
         return False, {'message': 'Database not accessible'}
@@ -199,7 +593,7 @@ def test_lambda_function(resource_id):
     """Lambda関数の匿名アクセステスト"""
     
     try:
-        lambda_client = boto3.client('lambda')
+        lambda_client = get_client('lambda')
         function_name = resource_id.split(':')[-1]
         
         try:
@@ -233,7 +627,7 @@ def test_eks_cluster(resource_id):
     """EKSクラスターの匿名アクセステスト"""
     
     try:
-        eks = boto3.client('eks')
+        eks = get_client('eks')
         cluster_name = resource_id.split('/')[-1]
         
         response = eks.describe_cluster(name=cluster_name)
@@ -262,19 +656,236 @@ def test_iam_user(resource_id):
     # IAMユーザーは直接アクセス対象ではない
     return False, {'message': 'IAM User is not directly accessible'}
 
-def test_tcp_port(host, port, timeout=5):
-    """TCPポート接続テスト"""
+class TokenBucket:
+    """スレッドセーフなトークンバケット（スロットリング時は補充レートを下げる）"""
+    
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """トークンを1つ取得できるまで待機"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            
+            # 待機中のスレッドが同時に再開しないようジッターを加える
+            time.sleep(wait * random.uniform(1.0, 1.5))
+    
+    def throttled(self):
+        """スロットリング検知時に補充レートを半減"""
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+    
+    def succeeded(self):
+        """成功時に補充レートを元の値まで徐々に戻す"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+_limiter_lock = threading.RLock()
+_rate_buckets = {}
+_host_limiters = OrderedDict()
+_clients = {}
+
+def get_rate_bucket(key, rate, burst):
+    """キー単位で共有されるトークンバケットを取得"""
+    
+    with _limiter_lock:
+        bucket = _rate_buckets.get(key)
+        if bucket is None:
+            bucket = _rate_buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+class _HostLimiter:
+    """宛先ホスト1つ分のトークンバケットと同時接続数の制限"""
+    
+    __slots__ = ('bucket', 'semaphore', 'active')
     
+    def __init__(self):
+        self.bucket = TokenBucket(PROBE_HOST_RATE, PROBE_HOST_BURST)
+        self.semaphore = threading.BoundedSemaphore(PROBE_HOST_CONCURRENCY)
+        self.active = 0
+
+def _checkout_host_limiter(host):
+    """ホストの制限状態を取得し、使用中として最近使った順の末尾へ移す"""
+    
+    with _limiter_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None:
+            limiter = _host_limiters[host] = _HostLimiter()
+            
+            # 上限を超えた分を古い順に破棄（待機・接続中のホストは同時接続数の制限を保つため残す）
+            excess = len(_host_limiters) - MAX_TRACKED_HOSTS
+            for idle_host in [h for h, l in _host_limiters.items() if l.active == 0 and h != host]:
+                if excess <= 0:
+                    break
+                del _host_limiters[idle_host]
+                excess -= 1
+        else:
+            _host_limiters.move_to_end(host)
+        
+        limiter.active += 1
+        return limiter
+
+@contextmanager
+def host_slot(host):
+    """宛先ホスト単位のレート制限と同時接続数制限"""
+    
+    limiter = _checkout_host_limiter(host)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        result = sock.connect_ex((host, port))
-        sock.close()
-        return result == 0
-    except:
-        return False
+        limiter.bucket.acquire()
+        with limiter.semaphore:
+            yield
+    finally:
+        with _limiter_lock:
+            limiter.active -= 1
+
+def get_client(service_name):
+    """レート制限付きのboto3クライアントを取得（ウォームコンテナ内で再利用）"""
+    
+    with _limiter_lock:
+        client = _clients.get(service_name)
+        if client is not None:
+            return client
+        
+        # botocoreのadaptiveモードでジッター付き指数バックオフとクライアント側の流量調整を行う
+        client = boto3.client(service_name, config=Config(
+            connect_timeout=AWS_API_TIMEOUT,
+            read_timeout=AWS_API_TIMEOUT,
+            retries={'max_attempts': AWS_MAX_ATTEMPTS, 'mode': 'adaptive'}
+        ))
+        bucket = get_rate_bucket(
+            ('aws', service_name, client.meta.region_name), AWS_API_RATE, AWS_API_BURST
+        )
+        
+        def before_send(**kwargs):
+            # リトライを含む各送信ごとにトークンを消費
+            bucket.acquire()
+        
+        def needs_retry(response=None, **kwargs):
+            if response is not None:
+                code = response[1].get('Error', {}).get('Code')
+                if code in THROTTLE_ERROR_CODES:
+                    print(f"Throttled by {service_name}: {code}")
+                    bucket.throttled()
+        
+        def after_call(parsed=None, **kwargs):
+            if parsed is not None and 'Error' not in parsed:
+                bucket.succeeded()
+        
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register('needs-retry', needs_retry)
+        client.meta.events.register('after-call', after_call)
+        
+        _clients[service_name] = client
+        return client
+
+def resolve_addresses(host, port):
+    """A/AAAAレコードを解決し、IPv6から始めてアドレスファミリーを交互に並べる"""
+    
+    infos = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    
+    by_family = {}
+    for family, _, _, _, sockaddr in infos:
+        addresses = by_family.setdefault(family, [])
+        if sockaddr not in addresses:
+            addresses.append(sockaddr)
+    
+    families = sorted(by_family, key=lambda f: f != socket.AF_INET6)
+    ordered = []
+    for i in range(max((len(a) for a in by_family.values()), default=0)):
+        for family in families:
+            if i < len(by_family[family]):
+                ordered.append((family, by_family[family][i]))
+    return ordered
+
+def _connection_info(family, sockaddr):
+    return {'address_family': ADDRESS_FAMILY_NAMES.get(family, str(family)), 'address': sockaddr[0]}
+
+def connect_tcp(host, port, timeout=PROBE_TIMEOUT):
+    """
+    Happy Eyeballs (RFC 8305) によるTCP接続テスト
+    全アドレスへ間隔を空けて接続を試行し、最初に成功したアドレスを返す（失敗時はNone）
+    """
+    
+    try:
+        with host_slot(host):
+            candidates = resolve_addresses(host, port)
+            deadline = time.monotonic() + timeout
+            next_attempt_at = 0.0
+            
+            with selectors.DefaultSelector() as selector:
+                try:
+                    while candidates or selector.get_map():
+                        now = time.monotonic()
+                        if now >= deadline:
+                            return None
+                        
+                        # 前の試行から一定時間経過するか失敗したら次のアドレスへ
+                        if candidates and (not selector.get_map() or now >= next_attempt_at):
+                            family, sockaddr = candidates.pop(0)
+                            try:
+                                sock = socket.socket(family, socket.SOCK_STREAM)
+                            except OSError:
+                                continue
+                            try:
+                                sock.setblocking(False)
+                                err = sock.connect_ex(sockaddr)
+                                if err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                                    selector.register(sock, selectors.EVENT_WRITE, (family, sockaddr))
+                            except Exception:
+                                # セレクタへ登録する前のソケットはここで閉じ、次のアドレスへ
+                                sock.close()
+                                continue
+                            if err == 0:
+                                sock.close()
+                                return _connection_info(family, sockaddr)
+                            if err not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                                sock.close()
+                                continue
+                            next_attempt_at = now + CONNECTION_ATTEMPT_DELAY
+                            continue
+                        
+                        wait = deadline - now
+                        if candidates:
+                            wait = min(wait, next_attempt_at - now)
+                        
+                        for key, _ in selector.select(max(wait, 0)):
+                            sock = key.fileobj
+                            family, sockaddr = key.data
+                            selector.unregister(sock)
+                            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                            sock.close()
+                            if err == 0:
+                                return _connection_info(family, sockaddr)
+                            next_attempt_at = 0.0
+                    
+                    return None
+                finally:
+                    # 残りの試行は打ち切る
+                    for key in list(selector.get_map().values()):
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+    except Exception:
+        return None
+
+def test_tcp_port(host, port, timeout=PROBE_TIMEOUT):
+    """TCPポート接続テスト"""
+    
+    return connect_tcp(host, port, timeout) is not None
 
-def test_http_url(url, timeout=5):
+def test_http_url(url, timeout=PROBE_TIMEOUT):
     """HTTP/HTTPS接続テスト"""
     
     try:
@@ -288,13 +899,14 @@ def test_http_url(url, timeout=5):
         ctx.verify_mode = ssl.CERT_NONE
         
         req = urllib.request.Request(url)
-        response = urllib.request.urlopen(req, timeout=timeout, context=ctx)
-        return response.getcode() < 500
+        with host_slot(urlparse(url).hostname):
+            response = urllib.request.urlopen(req, timeout=timeout, context=ctx)
+            return response.getcode() < 500
     except:
         return False
 
-def send_sns_notification(results):
-    """SNS通知送信"""
+def send_sns_notification(results, total_count=None):
+    """SNS通知送信（total_count省略時はresultsの件数）"""
     
     sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
     if not sns_topic_arn:
@@ -302,10 +914,11 @@ def send_sns_notification(results):
         return
     
     try:
-        sns = boto3.client('sns')
+        sns = get_client('sns')
         
         accessible_count = sum(1 for r in results if r['is_accessible'])
-        total_count = len(results)
+        if total_count is None:
+            total_count = len(results)
         
         # SNS用のメッセージ作成
         subject = f"Security Hub Exposure Alert: {accessible_count}件の匿名アクセス可能リソース"
@@ -51,7 +51,9 @@ resource "aws_lambda_function" "security_hub_processor" {
   
   environment {
     variables = {
-      SNS_TOPIC_ARN = aws_sns_topic.security_hub_alerts.arn
+      SNS_TOPIC_ARN     = aws_sns_topic.security_hub_alerts.arn
+      ACCOUNT_CACHE_TTL = "3600"
+      CARD_MAX_FINDINGS = "10"
     }
   }
 }
@@ -125,6 +127,14 @@ resource "aws_iam_role_policy" "lambda_execution_policy" {
           "sns:Publish"
         ]
         Resource = aws_sns_topic.security_hub_alerts.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "organizations:ListAccounts",
+          "organizations:DescribeAccount"
+        ]
+        Resource = "*"
       }
     ]
   })
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+エクスポートしたFindingsファイルをLambda外で一括検査するCLI
+
+使い方:
+    python offline_runner.py findings.json -o results.jsonl
+    python offline_runner.py findings.jsonl -o results.jsonl --workers 8 --concurrency 16
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from lambda_function import is_exposure_finding, process_finding
+
+# 入力ファイルの読み込み単位（文字数）
+READ_CHUNK_SIZE = 64 * 1024
+
+# 進捗を表示する間隔（秒）
+PROGRESS_INTERVAL = 5.0
+
+# ワーカー内でFindingを処理するスレッドプール
+_executor = None
+
+def iter_findings(f, read_size=READ_CHUNK_SIZE):
+    """JSON配列またはJSON LinesのFindingsを1件ずつ読み出す"""
+    
+    head = f.read(read_size)
+    if head.lstrip().startswith('['):
+        return _iter_json_array(f, head, read_size)
+    return _iter_json_lines(itertools.chain(io.StringIO(head + f.readline()), f))
+
+def _iter_json_array(f, buf, read_size):
+    """JSON配列を全体を読み込まずに要素ごとにデコード"""
+    
+    decoder = json.JSONDecoder()
+    pos = buf.index('[') + 1
+    eof = False
+    
+    while True:
+        # 要素間の空白と区切り文字を読み飛ばす
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        
+        if pos < len(buf):
+            if buf[pos] == ']':
+                return
+            try:
+                finding, pos = decoder.raw_decode(buf, pos)
+                yield finding
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            raise ValueError('Unterminated JSON array')
+        
+        # 要素が途中で切れているため続きを読み込む
+        chunk = f.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+def _iter_json_lines(lines):
+    """JSON Linesを1行ずつデコード（空行は無視、不正な行はログに出してスキップ）"""
+    
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"{line_no}行目のJSONが不正なためスキップします: {e}", file=sys.stderr)
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def _init_worker(concurrency, quiet):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=concurrency)
+    
+    # 個別のテストログを抑制
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+def _error_record(finding, error):
+    """処理できなかったFindingの結果レコード"""
+    
+    finding_id = finding.get('Id') if isinstance(finding, dict) else None
+    return json.dumps({'finding_id': finding_id, 'error': error}, default=str)
+
+def _process_one(finding):
+    """1件のFindingをテストし、(JSON行, アクセス可能か, エラーか) を返す"""
+    
+    try:
+        if not isinstance(finding, dict):
+            raise TypeError(f'Finding must be a JSON object, not {type(finding).__name__}')
+        result = process_finding(finding)
+        return json.dumps(result.to_dict(), default=str), result.is_accessible, False
+    except Exception as e:
+        return _error_record(finding, f'{type(e).__name__}: {e}'), False, True
+
+def _process_batch(findings):
+    """ワーカープロセス内でFindingをスレッド並列にテストし、JSON Linesを返す"""
+    
+    outcomes = list(_executor.map(_process_one, findings))
+    lines = [line for line, _, _ in outcomes]
+    accessible_count = sum(1 for _, accessible, _ in outcomes if accessible)
+    error_count = sum(1 for _, _, error in outcomes if error)
+    return lines, accessible_count, error_count
+
+def run(findings, output, workers, concurrency, batch_size, quiet=False):
+    """Findingsをプロセスプールで検査し、結果をJSON Linesで書き出す"""
+    
+    stats = {'processed': 0, 'accessible': 0, 'errors': 0}
+    started = time.monotonic()
+    last_progress = started
+    
+    # 入力を先読みしすぎないよう、実行中のバッチ数をワーカー数の数倍に抑える
+    max_pending = workers * 4
+    pending = {}
+    batches = _batched(findings, batch_size)
+    
+    def report(label):
+        elapsed = time.monotonic() - started
+        rate = stats['processed'] / elapsed if elapsed else 0.0
+        print(
+            f"{label}: {stats['processed']}件処理 ({rate:.1f}件/秒), "
+            f"匿名アクセス可能: {stats['accessible']}件, エラー: {stats['errors']}件, 経過: {elapsed:.1f}秒",
+            file=sys.stderr
+        )
+    
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(concurrency, quiet)
+    ) as pool:
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                else:
+                    pending[pool.submit(_process_batch, batch)] = batch
+            
+            if not pending:
+                break
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                try:
+                    lines, accessible_count, error_count = future.result()
+                except Exception as e:
+                    # ワーカーの異常終了等でもバッチ単位のエラーとして記録し処理を継続
+                    print(f"バッチ処理エラー ({len(batch)}件): {type(e).__name__}: {e}", file=sys.stderr)
+                    lines = [_error_record(f, f'{type(e).__name__}: {e}') for f in batch]
+                    accessible_count = 0
+                    error_count = len(batch)
+                
+                for line in lines:
+                    output.write(line + '\n')
+                stats['processed'] += len(lines)
+                stats['accessible'] += accessible_count
+                stats['errors'] += error_count
+            
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                report('進捗')
+                last_progress = now
+    
+    report('完了')
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='エクスポートしたExposure Findingsを一括で匿名アクセステスト')
+    parser.add_argument('input', help='Findingsファイル（JSON配列またはJSON Lines、"-"で標準入力）')
+    parser.add_argument('-o', '--output', default='-', help='結果の出力先（JSON Lines、デフォルトは標準出力）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ワーカープロセス数')
+    parser.add_argument('--concurrency', type=int, default=8, help='ワーカーごとの同時テスト数')
+    parser.add_argument('--batch-size', type=int, default=20, help='ワーカーへ渡す1回あたりのFinding数')
+    parser.add_argument('--all', action='store_true', help='Exposure以外のFindingもテストする')
+    parser.add_argument('--quiet', action='store_true', help='個別のテストログを出力しない')
+    args = parser.parse_args(argv)
+    
+    infile = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    
+    # 標準出力へ結果を書く場合はテストログと混ざらないようにする
+    quiet = args.quiet or outfile is sys.stdout
+    
+    try:
+        findings = iter_findings(infile)
+        if not args.all:
+            # オブジェクト以外の要素はワーカーでエラーとして記録する
+            findings = (f for f in findings if not isinstance(f, dict) or is_exposure_finding(f))
+        
+        run(findings, outfile, args.workers, args.concurrency, args.batch_size, quiet)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -122,6 +122,120 @@ def test_tcp_connection():
     print("✅ TCP Connection Test: PASSED")
     return True
 
+def test_happy_eyeballs_connection():
+    """Happy Eyeballsによる複数アドレスへのTCP接続テスト"""
+    print("\n=== Happy Eyeballs Connection Test ===")
+    
+    import socket
+    import time
+    import lambda_function
+    from lambda_function import CONNECTION_ATTEMPT_DELAY, connect_tcp, resolve_addresses
+    
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    port = listener.getsockname()[1]
+    
+    # 接続を拒否するアドレス（勝者と区別できるよう別のループバックアドレス）
+    closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    closed.bind(('127.0.0.2', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    
+    # 応答の遅いアドレス（バックログを埋めてSYNが応答されない状態にする）
+    slow = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    slow.bind(('127.0.0.3', 0))
+    slow.listen(0)
+    slow_port = slow.getsockname()[1]
+    fillers = []
+    for _ in range(8):
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex(('127.0.0.3', slow_port))
+        fillers.append(filler)
+    time.sleep(0.1)
+    
+    original_resolve = lambda_function.resolve_addresses
+    try:
+        # IPv6が先頭になり、アドレスファミリーが交互に並ぶ
+        def fake_getaddrinfo(host, port, *args):
+            return [
+                (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', port)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.2', port)),
+                (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::1', port, 0, 0)),
+            ]
+        
+        original_getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = fake_getaddrinfo
+        try:
+            ordered = [sockaddr[0] for _, sockaddr in resolve_addresses('dual-stack.test', 80)]
+        finally:
+            socket.getaddrinfo = original_getaddrinfo
+        print(f"  Attempt order: {ordered}")
+        assert ordered == ['2001:db8::1', '192.0.2.1', '192.0.2.2']
+        
+        # 先頭アドレスが拒否されたら待たずに次のアドレスで接続できる
+        lambda_function.resolve_addresses = lambda host, p: [
+            (socket.AF_INET, ('127.0.0.2', closed_port)),
+            (socket.AF_INET, ('127.0.0.1', port)),
+        ]
+        started = time.monotonic()
+        connection = connect_tcp('multi-address.test', port, timeout=3)
+        elapsed = time.monotonic() - started
+        print(f"  Refused first: {connection} ({elapsed:.2f}s)")
+        assert connection == {'address_family': 'IPv4', 'address': '127.0.0.1'}
+        assert elapsed < CONNECTION_ATTEMPT_DELAY, "A refused address should not delay the next attempt"
+        
+        # 先頭アドレスが応答しない場合は試行間隔の経過後に次のアドレスが追い越す
+        lambda_function.resolve_addresses = lambda host, p: [
+            (socket.AF_INET, ('127.0.0.3', slow_port)),
+            (socket.AF_INET, ('127.0.0.1', port)),
+        ]
+        started = time.monotonic()
+        connection = connect_tcp('slow-first.test', port, timeout=3)
+        elapsed = time.monotonic() - started
+        print(f"  Slow first: {connection} ({elapsed:.2f}s)")
+        assert connection == {'address_family': 'IPv4', 'address': '127.0.0.1'}
+        assert CONNECTION_ATTEMPT_DELAY * 0.9 <= elapsed < 1, "Second attempt should start after the attempt delay"
+        
+        # 全アドレスが失敗した場合はNone
+        lambda_function.resolve_addresses = lambda host, p: [
+            (socket.AF_INET, ('127.0.0.2', closed_port)),
+        ]
+        assert connect_tcp('refused.test', closed_port, timeout=1) is None
+        
+        # connect_exが例外を送出してもソケットを閉じて次のアドレスへ進む
+        created = []
+        original_socket = socket.socket
+        
+        class TrackedSocket(original_socket):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                created.append(self)
+        
+        lambda_function.resolve_addresses = lambda host, p: [
+            (socket.AF_INET, ('127.0.0.1', 70000)),
+            (socket.AF_INET, ('127.0.0.1', port)),
+        ]
+        socket.socket = TrackedSocket
+        try:
+            connection = connect_tcp('invalid-port.test', port, timeout=3)
+        finally:
+            socket.socket = original_socket
+        print(f"  Invalid first: {connection}, sockets left open: {sum(s.fileno() != -1 for s in created)}")
+        assert connection == {'address_family': 'IPv4', 'address': '127.0.0.1'}
+        assert len(created) == 2
+        assert all(s.fileno() == -1 for s in created), "Sockets must be closed even if connect_ex raises"
+    finally:
+        lambda_function.resolve_addresses = original_resolve
+        listener.close()
+        slow.close()
+        for filler in fillers:
+            filler.close()
+    
+    print("✅ Happy Eyeballs Connection Test: PASSED")
+    return True
+
 def test_http_connection():
     """HTTP接続テスト"""
     print("\n=== HTTP Connection Test ===")
@@ -279,9 +393,471 @@ def test_edge_cases():
     assert body['processed_count'] == 0
     print("✅ Non-exposure findings filtered correctly")
     
+    # SeverityやリソースタイプがnullのFindingでもバッチ全体は失敗しない
+    malformed_event = {
+        "detail": {
+            "findings": [
+                {
+                    "Id": "test-null-label",
+                    "Type": ["Exposure"],
+                    "Severity": {"Label": None},
+                    "Resources": [{"Type": None, "Id": "arn:aws:test:::null-type"}]
+                },
+                {
+                    "Id": "test-valid",
+                    "Type": ["Exposure"],
+                    "Severity": {"Label": "LOW"},
+                    "Resources": [{"Type": "AWS::IAM::User", "Id": "arn:aws:iam::123456789012:user/test"}]
+                }
+            ]
+        }
+    }
+    result = lambda_handler(malformed_event, {})
+    assert result['statusCode'] == 200
+    body = json.loads(result['body'])
+    assert body['processed_count'] == 2
+    null_result = [r for r in body['results'] if r['finding_id'] == 'test-null-label'][0]
+    assert null_result['severity'] is None
+    assert 'Unsupported resource type' in null_result['test_results'][0]['details']['error']
+    print("✅ Null Severity.Label / resource Type handled correctly")
+    
     print("✅ Edge Cases Test: PASSED")
     return True
 
+def test_result_stream():
+    """結果のストリーミングエンコードとサマリー切替のテスト"""
+    print("\n=== Result Stream Test ===")
+    
+    import lambda_function
+    from lambda_function import (
+        FindingResult, ResourceTestResult, ResultStream, build_response_body
+    )
+    
+    stream = ResultStream()
+    for i in range(1000):
+        result = FindingResult(f'finding-{i:04d}', 'Test Finding', 'HIGH', '2025-01-01T12:00:00')
+        result.add(ResourceTestResult(
+            'AWS::S3::Bucket', f'arn:aws:s3:::bucket-{i}', i % 10 == 0,
+            {'accessible_endpoint': f'https://bucket-{i}.s3.amazonaws.com/', 'method': 'HTTP'}
+        ))
+        stream.write(result)
+    
+    try:
+        # 上限内なら全件がレスポンスに含まれる
+        body = json.loads(build_response_body(stream))
+        assert body['processed_count'] == 1000
+        assert body['accessible_count'] == 100
+        assert len(body['results']) == 1000
+        assert body['results'][0]['test_results'][0]['details']['method'] == 'HTTP'
+        print(f"  Full response: {stream.size} bytes")
+        
+        # 上限を超える場合はサマリーのみ
+        original_limit = lambda_function.MAX_RESPONSE_BYTES
+        lambda_function.MAX_RESPONSE_BYTES = 1024
+        try:
+            body = json.loads(build_response_body(stream))
+        finally:
+            lambda_function.MAX_RESPONSE_BYTES = original_limit
+        assert body['results_truncated'] is True
+        assert 'results' not in body
+        assert body['accessible_findings'][0] == 'finding-0000'
+        print(f"  Summary response: {len(body['accessible_findings'])} accessible findings listed")
+    finally:
+        stream.discard()
+    
+    # エスケープ前は上限内でも、レスポンス全体でエスケープされると超える場合はサマリーのみ
+    stream = ResultStream()
+    for i in range(50):
+        stream.write(FindingResult(f'jp-{i}', '公開されたS3バケット' * 5, 'HIGH', '2025-01-01T12:00:00'))
+    try:
+        original_limit = lambda_function.MAX_RESPONSE_BYTES
+        lambda_function.MAX_RESPONSE_BYTES = stream.size + 200
+        try:
+            body = build_response_body(stream)
+        finally:
+            lambda_function.MAX_RESPONSE_BYTES = original_limit
+        assert json.loads(body)['results_truncated'] is True
+        print(f"  Escaped size check: raw {stream.size} bytes -> summary only")
+    finally:
+        stream.discard()
+    
+    # 結果の保存に失敗してもテスト結果は返す
+    original_sink = os.environ.get('RESULTS_SINK')
+    os.environ['RESULTS_SINK'] = '/nonexistent/dir/out.json'
+    try:
+        result = lambda_function.lambda_handler({
+            'detail': {'findings': [{
+                'Id': 'export-failure',
+                'Type': ['Exposure'],
+                'Severity': {'Label': 'LOW'},
+                'Resources': [{'Type': 'AWS::IAM::User', 'Id': 'arn:aws:iam::123456789012:user/test'}]
+            }]}
+        }, {})
+    finally:
+        if original_sink:
+            os.environ['RESULTS_SINK'] = original_sink
+        else:
+            os.environ.pop('RESULTS_SINK', None)
+    assert result['statusCode'] == 200
+    body = json.loads(result['body'])
+    assert 'results_location' not in body
+    assert body['results'][0]['finding_id'] == 'export-failure'
+    print("  Export failure: results still returned")
+    
+    print("✅ Result Stream Test: PASSED")
+    return True
+
+def test_probe_scheduler():
+    """重要度・残り時間に基づくスケジューリングのテスト"""
+    print("\n=== Probe Scheduler Test ===")
+    
+    from lambda_function import ProbeScheduler, RESOURCE_COST_ESTIMATES, SCHEDULER_RESERVE_MS, estimate_finding_cost
+    
+    class FakeContext:
+        def __init__(self, remaining_ms):
+            self.remaining_ms = remaining_ms
+        
+        def get_remaining_time_in_millis(self):
+            return self.remaining_ms
+    
+    def make_finding(finding_id, severity, resource_type):
+        return {
+            'Id': finding_id,
+            'Type': ['Exposure'],
+            'Severity': {'Label': severity},
+            'Resources': [{'Type': resource_type, 'Id': f'arn:aws:test:::{finding_id}'}]
+        }
+    
+    findings = [
+        make_finding('low-ec2', 'LOW', 'AWS::EC2::Instance'),
+        make_finding('medium-s3', 'MEDIUM', 'AWS::S3::Bucket'),
+        make_finding('critical-ec2', 'CRITICAL', 'AWS::EC2::Instance'),
+        make_finding('high-iam', 'HIGH', 'AWS::IAM::User'),
+    ]
+    
+    ec2_ms = int(RESOURCE_COST_ESTIMATES['AWS::EC2::Instance'] * 1000)
+    rds_ms = int(RESOURCE_COST_ESTIMATES['AWS::RDS::DBInstance'] * 1000)
+    s3_ms = int(RESOURCE_COST_ESTIMATES['AWS::S3::Bucket'] * 1000)
+    iam_ms = int(RESOURCE_COST_ESTIMATES['AWS::IAM::User'] * 1000)
+    
+    # 時間に余裕があれば重要度順に全件処理
+    scheduler = ProbeScheduler(findings, FakeContext(SCHEDULER_RESERVE_MS + 2 * ec2_ms + s3_ms + iam_ms + 1000))
+    order = [f['Id'] for f in scheduler]
+    print(f"  Order: {order}")
+    assert order == ['critical-ec2', 'high-iam', 'medium-s3', 'low-ec2']
+    assert scheduler.deferred == []
+    
+    def run_scheduler(findings, remaining_ms, actual_ratio=1.0):
+        context = FakeContext(SCHEDULER_RESERVE_MS + remaining_ms)
+        scheduler = ProbeScheduler(findings, context)
+        order = []
+        for finding in scheduler:
+            order.append(finding['Id'])
+            # テスト実行で見積もりのactual_ratio倍の時間を消費したものとする
+            context.remaining_ms -= int(estimate_finding_cost(finding) * 1000 * actual_ratio)
+            assert context.remaining_ms >= SCHEDULER_RESERVE_MS, 'reserved time was consumed'
+        return order, [f['Id'] for f in scheduler.deferred]
+    
+    # 残り時間が足りない場合は低優先度のものから先送り
+    order, deferred = run_scheduler(findings, ec2_ms + iam_ms + s3_ms // 2)
+    print(f"  Order: {order}, Deferred: {deferred}")
+    assert order == ['critical-ec2', 'high-iam']
+    assert deferred == ['medium-s3', 'low-ec2']
+    
+    # 下位クラスの件数が多くても、収まる上位クラスのFindingは先送りされない
+    burst = (
+        [make_finding('critical0', 'CRITICAL', 'AWS::EC2::Instance')]
+        + [make_finding(f'high{i}', 'HIGH', 'AWS::RDS::DBInstance') for i in range(5)]
+        + [make_finding(f'low{i}', 'LOW', 'AWS::EC2::Instance') for i in range(20)]
+    )
+    order, deferred = run_scheduler(burst, 3 * ec2_ms + 5 * rds_ms + ec2_ms // 2)
+    print(f"  Order: {order}, Deferred: {len(deferred)} findings")
+    assert order == ['critical0'] + [f'high{i}' for i in range(5)] + ['low0', 'low1']
+    assert deferred == [f'low{i}' for i in range(2, 20)]
+    
+    # 実際の所要時間が見積もりを超えた場合は、以降の見積もりを引き上げて予約時間を守る
+    slow = [make_finding(f'slow{i}', 'LOW', 'AWS::EC2::Instance') for i in range(3)]
+    order, deferred = run_scheduler(slow, int(ec2_ms * 2.4), actual_ratio=1.3)
+    print(f"  Order: {order}, Deferred: {deferred}")
+    assert order == ['slow0']
+    assert deferred == ['slow1', 'slow2']
+    
+    # コンテキストが無い場合は先送りしない
+    scheduler = ProbeScheduler(findings, {})
+    assert len(list(scheduler)) == 4
+    
+    print("✅ Probe Scheduler Test: PASSED")
+    return True
+
+def test_defer_findings_sqs():
+    """先送りしたFindingのSQS送信（失敗エントリと先送り回数）のテスト"""
+    print("\n=== Defer Findings (SQS) Test ===")
+    
+    import boto3
+    from botocore.stub import ANY, Stubber
+    import lambda_function
+    from lambda_function import defer_findings, extract_findings, MAX_DEFER_DEPTH
+    
+    findings = [{'Id': f'deferred-{i}', 'Type': ['Exposure']} for i in range(12)]
+    sqs = boto3.client(
+        'sqs', region_name='ap-northeast-1',
+        aws_access_key_id='test', aws_secret_access_key='test'
+    )
+    stubber = Stubber(sqs)
+    stubber.add_response(
+        'send_message_batch',
+        {
+            'Successful': [
+                {'Id': str(n), 'MessageId': f'm{n}', 'MD5OfMessageBody': 'x'} for n in range(10) if n != 3
+            ],
+            'Failed': [{'Id': '3', 'SenderFault': False, 'Code': 'InternalError'}]
+        },
+        {'QueueUrl': ANY, 'Entries': ANY}
+    )
+    stubber.add_response(
+        'send_message_batch',
+        {
+            'Successful': [{'Id': str(n), 'MessageId': f'm{n}', 'MD5OfMessageBody': 'x'} for n in range(2)],
+            'Failed': []
+        },
+        {'QueueUrl': ANY, 'Entries': ANY}
+    )
+    
+    sent = []
+    sqs.meta.events.register(
+        'before-parameter-build.sqs.SendMessageBatch',
+        lambda params, **kwargs: sent.extend(json.loads(e['MessageBody']) for e in params['Entries'])
+    )
+    
+    original_client = lambda_function._clients.get('sqs')
+    original_queue = os.environ.get('DEFERRED_QUEUE_URL')
+    lambda_function._clients['sqs'] = sqs
+    os.environ['DEFERRED_QUEUE_URL'] = 'https://sqs.ap-northeast-1.amazonaws.com/123456789012/deferred'
+    try:
+        with stubber:
+            deferred_to, failed = defer_findings(findings, None, depth=1)
+        
+        # 失敗したエントリは先送り済みとして扱わない
+        assert deferred_to == 'sqs'
+        assert [f['Id'] for f in failed] == ['deferred-3']
+        
+        # メッセージには次の先送り回数が含まれ、受信側で引き継がれる
+        assert all(body['deferred_depth'] == 2 for body in sent)
+        records = [{'eventSource': 'aws:sqs', 'body': json.dumps(body)} for body in sent[:2]]
+        extracted, depth = extract_findings({'Records': records})
+        assert [f['Id'] for f in extracted] == ['deferred-0', 'deferred-1']
+        assert depth == 2
+        
+        # 上限に達した場合は送信しない
+        deferred_to, failed = defer_findings(findings, None, depth=MAX_DEFER_DEPTH)
+        assert deferred_to is None and len(failed) == len(findings)
+        print(f"  Sent: {len(sent)}, Failed: 1, depth limit: {MAX_DEFER_DEPTH}")
+    finally:
+        if original_client is None:
+            lambda_function._clients.pop('sqs', None)
+        else:
+            lambda_function._clients['sqs'] = original_client
+        if original_queue:
+            os.environ['DEFERRED_QUEUE_URL'] = original_queue
+        else:
+            os.environ.pop('DEFERRED_QUEUE_URL', None)
+    
+    print("✅ Defer Findings (SQS) Test: PASSED")
+    return True
+
+def test_rate_limiting():
+    """トークンバケットとホスト単位の同時接続数制限のテスト"""
+    print("\n=== Rate Limiting Test ===")
+    
+    import threading
+    import time
+    from lambda_function import TokenBucket, host_slot, PROBE_HOST_CONCURRENCY
+    
+    # バースト分は待たずに取得でき、以降は補充レートで制限される
+    bucket = TokenBucket(rate=20, burst=5)
+    started = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    print(f"  10 tokens (burst=5, rate=20/s): {elapsed:.2f}s")
+    assert elapsed >= 0.2, "Tokens beyond burst should be rate limited"
+    
+    # スロットリング時はレートが下がり、成功で元に戻る
+    bucket.throttled()
+    assert bucket.rate == 10
+    for _ in range(10):
+        bucket.succeeded()
+    assert bucket.rate == 20
+    
+    # 同一ホストへの同時接続数は上限を超えない
+    active = []
+    peak = []
+    lock = threading.Lock()
+    
+    def probe():
+        with host_slot('rate-limit-test.invalid'):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+    
+    threads = [threading.Thread(target=probe) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"  Peak concurrency per host: {max(peak)}")
+    assert max(peak) <= PROBE_HOST_CONCURRENCY
+    
+    # 多数のホストへ接続しても制限状態は上限数までしか保持せず、使用中のホストは破棄しない
+    import lambda_function
+    original_max = lambda_function.MAX_TRACKED_HOSTS
+    lambda_function.MAX_TRACKED_HOSTS = 3
+    try:
+        with host_slot('busy.invalid'):
+            for i in range(10):
+                with host_slot(f'host{i}.invalid'):
+                    pass
+            tracked = list(lambda_function._host_limiters)
+            print(f"  Tracked hosts: {tracked}")
+            assert len(tracked) <= 3
+            assert 'busy.invalid' in tracked
+            assert 'host9.invalid' in tracked
+    finally:
+        lambda_function.MAX_TRACKED_HOSTS = original_max
+    
+    print("✅ Rate Limiting Test: PASSED")
+    return True
+
+def test_offline_runner_input():
+    """オフラインCLIの入力形式（JSON配列/JSON Lines）のテスト"""
+    print("\n=== Offline Runner Input Test ===")
+    
+    import io
+    from offline_runner import iter_findings
+    
+    findings = [
+        {'Id': f'finding-{i}', 'Types': ['Exposure'], 'Title': f'テスト {i} [x]'}
+        for i in range(50)
+    ]
+    
+    # 小さな読み込み単位で要素の途中分割を発生させる
+    array_text = json.dumps(findings, indent=2, ensure_ascii=False)
+    parsed = list(iter_findings(io.StringIO(array_text), read_size=7))
+    assert parsed == findings, "JSON array should be decoded element by element"
+    print(f"  JSON array: {len(parsed)} findings")
+    
+    lines_text = '\n'.join(json.dumps(f) for f in findings) + '\n\n'
+    parsed = list(iter_findings(io.StringIO(lines_text), read_size=7))
+    assert parsed == findings, "JSON Lines should be decoded line by line"
+    print(f"  JSON Lines: {len(parsed)} findings")
+    
+    assert list(iter_findings(io.StringIO('[]'))) == []
+    
+    # 不正なFindingやバッチの失敗があっても他の結果は書き出され、処理は継続する
+    from offline_runner import run
+    
+    findings = [
+        {'Id': 'ok-1', 'Types': ['Exposure'], 'Resources': [{'Type': 'AWS::IAM::User', 'Id': 'u1'}]},
+        {'Id': 'null-resources', 'Types': ['Exposure'], 'Resources': None},
+        'not-an-object',
+        # プロセス間で受け渡せずバッチ全体が失敗する
+        {'Id': 'unpicklable', 'Types': ['Exposure'], 'Resources': [], 'hook': lambda: None},
+        {'Id': 'ok-2', 'Types': ['Exposure'], 'Resources': [{'Type': 'AWS::IAM::User', 'Id': 'u2'}]},
+    ]
+    output = io.StringIO()
+    stats = run(findings, output, workers=1, concurrency=2, batch_size=1, quiet=True)
+    records = {r['finding_id']: r for r in map(json.loads, output.getvalue().splitlines())}
+    print(f"  Run stats: {stats}")
+    assert stats == {'processed': 5, 'accessible': 0, 'errors': 3}
+    assert 'test_results' in records['ok-1'] and 'test_results' in records['ok-2']
+    assert records['null-resources']['error'].startswith('TypeError')
+    assert 'JSON object' in records[None]['error']
+    assert 'error' in records['unpicklable']
+    
+    print("✅ Offline Runner Input Test: PASSED")
+    return True
+
+def test_teams_notification_cards():
+    """Teams通知（lambda.py）のアカウント名キャッシュとカード集約のテスト"""
+    print("\n=== Teams Notification Cards Test ===")
+    
+    import importlib
+    notifier = importlib.import_module('lambda')
+    
+    class FakePaginator:
+        def __init__(self, client):
+            self.client = client
+        
+        def paginate(self):
+            self.client.list_calls += 1
+            yield {'Accounts': [{'Id': '111111111111', 'Name': 'Prod'}]}
+            yield {'Accounts': [{'Id': '222222222222', 'Name': 'Dev'}]}
+    
+    class FakeOrganizations:
+        def __init__(self):
+            self.list_calls = 0
+            self.describe_calls = 0
+        
+        def get_paginator(self, name):
+            assert name == 'list_accounts'
+            return FakePaginator(self)
+        
+        def describe_account(self, AccountId):
+            self.describe_calls += 1
+            return {'Account': {'Id': AccountId, 'Name': f'Lazy-{AccountId}'}}
+    
+    client = FakeOrganizations()
+    directory = notifier.AccountDirectory(ttl=3600)
+    directory._client = client
+    original_directory = notifier._account_directory
+    notifier._account_directory = directory
+    
+    try:
+        findings = [
+            {
+                'Id': f'finding-{i}',
+                'AwsAccountId': ['111111111111', '222222222222', '333333333333'][i % 3],
+                'Title': f'Finding {i}',
+                'Severity': {'Label': 'CRITICAL' if i == 7 else 'MEDIUM'},
+                'Resources': [{'Type': 'AWS::S3::Bucket', 'Id': f'arn:aws:s3:::bucket-{i}'}]
+            }
+            for i in range(25)
+        ]
+        cards = list(notifier.render_cards(findings))
+        
+        # 一覧の取得は1回、一覧に無いアカウントのみ個別取得
+        assert client.list_calls == 1
+        assert client.describe_calls == 1
+        
+        expected_cards = -(-len(findings) // notifier.CARD_MAX_FINDINGS)
+        assert len(cards) == expected_cards, f"Expected {expected_cards} cards, got {len(cards)}"
+        
+        subject, message = cards[0]
+        card = json.loads(message)
+        body = card['attachments'][0]['content']['body']
+        facts = [b for b in body if b['type'] == 'FactSet']
+        assert len(facts) == min(len(findings), notifier.CARD_MAX_FINDINGS)
+        assert facts[2]['facts'][1]['value'] == 'Lazy-333333333333'
+        assert subject.startswith('Security Hub Alert - CRITICAL')
+        assert len(subject) <= notifier.MAX_SUBJECT_LENGTH
+        print(f"  {len(findings)} findings -> {len(cards)} cards, subject: {subject}")
+        
+        # 単一Findingの件名は改行・制御文字を含まず100文字未満
+        long_title = 'S3 bucket\r\nallows\tpublic\x00 access ' + 'x' * 200
+        subject, _ = next(notifier.render_cards([dict(findings[0], Title=long_title)]))
+        print(f"  Single finding subject ({len(subject)} chars): {subject[:60]}...")
+        assert len(subject) < 100
+        assert subject.startswith('Security Hub Alert - MEDIUM - S3 bucket allows public access')
+        assert not any(ord(c) < 32 for c in subject)
+    finally:
+        notifier._account_directory = original_directory
+    
+    print("✅ Teams Notification Cards Test: PASSED")
+    return True
+
 def main():
     """メインテスト実行"""
     print("🧪 Security Hub Exposure Checker - Lambda Function Tests")
@@ -289,10 +865,17 @@ def main():
     
     tests = [
         test_tcp_connection,
+        test_happy_eyeballs_connection,
         test_http_connection,
         test_resource_type_handling,
         test_sns_notification,
         test_edge_cases,
+        test_result_stream,
+        test_probe_scheduler,
+        test_defer_findings_sqs,
+        test_rate_limiting,
+        test_offline_runner_input,
+        test_teams_notification_cards,
         test_lambda_handler,
     ]
     